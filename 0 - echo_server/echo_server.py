@@ -2,6 +2,11 @@ import asyncio
 from asyncio import StreamReader
 from asyncio import StreamWriter
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 
 async def handle_echo(reader: StreamReader, writer: StreamWriter):
     data = await reader.read()
@@ -21,4 +26,7 @@ async def main():
 
 
 if __name__ == '__main__':
+    if uvloop:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
     asyncio.run(main())
@@ -1,6 +1,5 @@
 import asyncio
 import json
-import math
 from asyncio import IncompleteReadError
 from asyncio import StreamReader
 from asyncio import StreamWriter
@@ -8,6 +7,18 @@ from typing import Any
 from typing import Optional
 from typing import Union
 
+from miller_rabin import miller_rabin
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 
 def is_prime(number: Union[int, float]) -> bool:
     # 0 and negative numbers are not prime
@@ -17,16 +28,39 @@ def is_prime(number: Union[int, float]) -> bool:
     if isinstance(number, float):
         return False
 
-    for i in range(2, int(math.sqrt(number)) + 1):
-        if (number % i) == 0:
-            return False
+    return miller_rabin(number)
+
+
+def parse_json(request_json: bytes) -> Any:
+    if not orjson:
+        return json.loads(request_json)
+
+    try:
+        request = orjson.loads(request_json)
+    except orjson.JSONDecodeError as e:
+        # orjson rejects numbers that overflow a double, the stdlib parser may still accept them
+        if 'number is infinity' not in str(e):
+            raise
+        return json.loads(request_json)
+
+    # orjson parses integers beyond 64 bits as floats, only the stdlib parser keeps them exact
+    number = request.get('number', None) if isinstance(request, dict) else None
+    if isinstance(number, float) and abs(number) >= 2 ** 63:
+        return json.loads(request_json)
+
+    return request
 
-    return True
 
+def dump_json(response: dict[str, Any]) -> bytes:
+    if not orjson:
+        return json.dumps(response).encode('ascii')
 
-def get_valid_request(request_json: str) -> Optional[dict[str, Any]]:
+    return orjson.dumps(response)
+
+
+def get_valid_request(request_json: bytes) -> Optional[dict[str, Any]]:
     try:
-        request = json.loads(request_json)
+        request = parse_json(request_json)
     except json.JSONDecodeError:
         return None
 
@@ -45,7 +79,7 @@ def get_valid_request(request_json: str) -> Optional[dict[str, Any]]:
 
 async def handle_is_prime(reader: StreamReader, writer: StreamWriter) -> None:
     async def send(response: bytes) -> None:
-        writer.write(response + b'\n')
+        writer.writelines((response, b'\n'))
         await writer.drain()
 
     async def end_connection() -> None:
@@ -54,14 +88,14 @@ async def handle_is_prime(reader: StreamReader, writer: StreamWriter) -> None:
 
     try:
         while data := await reader.readuntil(separator=b'\n'):
-            request = get_valid_request(data.decode('ascii'))
+            request = get_valid_request(data)
             if not request:
                 return await end_connection()
 
-            await send(json.dumps({
+            await send(dump_json({
                 'method': 'isPrime',
                 'prime': is_prime(request['number']),
-            }).encode('ascii'))
+            }))
 
         writer.close()
     except IncompleteReadError:
@@ -77,4 +111,7 @@ async def main():
 
 
 if __name__ == '__main__':
+    if uvloop:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
     asyncio.run(main())
@@ -0,0 +1,30 @@
+# Testing against these witnesses is deterministic for all numbers below 3.317 * 10**24.
+# Above that a composite passing every witness is answered as prime, so results there are probabilistic.
+SMALL_PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+
+
+def miller_rabin(number: int) -> bool:
+    if number in SMALL_PRIMES:
+        return True
+    if any(number % p == 0 for p in SMALL_PRIMES):
+        return False
+
+    # Write number - 1 as d * 2**s with d odd
+    d, s = number - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+
+    for witness in SMALL_PRIMES:
+        x = pow(witness, d, number)
+        if x == 1 or x == number - 1:
+            continue
+
+        for _ in range(s - 1):
+            x = pow(x, 2, number)
+            if x == number - 1:
+                break
+        else:
+            return False
+
+    return True
@@ -1,13 +1,20 @@
 import asyncio
 import bisect
-import statistics
+import itertools
+import logging
 import struct
 from asyncio import IncompleteReadError
 from asyncio import StreamReader
 from asyncio import StreamWriter
-from statistics import StatisticsError
-from typing import Iterable
 from typing import NamedTuple
+from typing import Optional
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+logger = logging.getLogger(__name__)
 
 
 class InputRecord(NamedTuple):
@@ -25,37 +32,51 @@ class QueryRecord(NamedTuple):
 class RequestContext:
     reader: StreamReader
     writer: StreamWriter
-    database: list[InputRecord]
+    timestamps: list[int]
+    prices: list[int]
+    prefix_sums: Optional[list[int]]
     
     def __init__(self, reader: StreamReader, writer: StreamWriter) -> None:
         self.reader = reader
         self.writer = writer
-        self.database = []
+        self.timestamps = []
+        self.prices = []
+        self.prefix_sums = [0]
     
     def insert(self, record: InputRecord) -> None:
-        bisect.insort_left(self.database, record, key=lambda r: r.timestamp)
+        if not self.timestamps or record.timestamp > self.timestamps[-1]:
+            self.timestamps.append(record.timestamp)
+            self.prices.append(record.price)
+            if self.prefix_sums is not None:
+                self.prefix_sums.append(self.prefix_sums[-1] + record.price)
+            return
+        
+        index = bisect.bisect_left(self.timestamps, record.timestamp)
+        self.timestamps.insert(index, record.timestamp)
+        self.prices.insert(index, record.price)
+        # Rebuilt lazily on the next query
+        self.prefix_sums = None
     
-    def get_range(self, start: int, end: int) -> Iterable[int]:
-        return (
-            record.price
-            for record in self.database[start:end]
-        )
+    def get_mean(self, mintime: int, maxtime: int) -> int:
+        start_index = bisect.bisect_left(self.timestamps, mintime)
+        end_index = bisect.bisect_right(self.timestamps, maxtime)
+        if end_index <= start_index:
+            return 0
+        
+        if self.prefix_sums is None:
+            self.prefix_sums = list(itertools.accumulate(self.prices, initial=0))
+        
+        total = self.prefix_sums[end_index] - self.prefix_sums[start_index]
+        return int(total / (end_index - start_index))
 
 
 def handle_output_record(record: QueryRecord, context: RequestContext) -> None:
-    try:
-        start_index = bisect.bisect_left(context.database, record.mintime, key=lambda r: r.timestamp)
-        end_index = bisect.bisect_right(context.database, record.maxtime, key=lambda r: r.timestamp)
-        mean = int(statistics.mean(context.get_range(start_index, end_index)))
-    except StatisticsError:
-        mean = 0
-    
+    mean = context.get_mean(record.mintime, record.maxtime)
     context.writer.write(mean.to_bytes(4, byteorder='big', signed=True))
 
 
 def handle_record(record: bytes, context: RequestContext) -> None:
     record_type, int1, int2 = struct.unpack('!cii', record)
-    print(">>>>>>", record_type, int1, int2)
     if record_type == b'I':
         return context.insert(InputRecord(record_type, int1, int2))
     if record_type == b'Q':
@@ -73,7 +94,7 @@ async def handle_request(reader: StreamReader, writer: StreamWriter) -> None:
         writer.write_eof()
         writer.close()
     except (IncompleteReadError, ValueError) as e:
-        print(e)
+        logger.debug('bad record', exc_info=e)
         
         writer.write_eof()
         writer.close()
@@ -88,4 +109,7 @@ async def main():
 
 
 if __name__ == '__main__':
+    if uvloop:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
     asyncio.run(main())
@@ -2,19 +2,21 @@ import asyncio
 from asyncio import StreamReader
 from asyncio import StreamWriter
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 users = {}
 
 
 async def broadcast(message: str, exclude_username: str):
-    writer_coroutines = []
-    for username, writer in users.items():
-        if exclude_username == username:
-            continue
+    encoded = message.encode()
+    writers = [writer for username, writer in users.items() if username != exclude_username]
+    for writer in writers:
+        writer.write(encoded)
 
-        writer.write(message.encode())
-        writer_coroutines.append(writer.drain())
-
-    return await asyncio.gather(*writer_coroutines)
+    return await asyncio.gather(*(writer.drain() for writer in writers))
 
 
 async def handle_echo(reader: StreamReader, writer: StreamWriter):
@@ -63,4 +65,7 @@ async def main():
 
 
 if __name__ == '__main__':
+    if uvloop:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
     asyncio.run(main())
@@ -1,6 +1,11 @@
 import asyncio
 from asyncio import DatagramTransport
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 database: dict[bytes, bytes] = {}
 
 
@@ -21,6 +26,9 @@ class KenKeyValueProtocol:
 
 
 if __name__ == '__main__':
+    if uvloop:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
     loop = asyncio.new_event_loop()
     listen = loop.create_datagram_endpoint(KenKeyValueProtocol, local_addr=('0.0.0.0', 8888))
     transport, protocol = loop.run_until_complete(listen)
@@ -4,9 +4,18 @@ from asyncio import StreamReader
 from asyncio import StreamWriter
 from typing import Callable
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+BOGUS_COIN_ADDRESS = re.compile(rb'(\b)7[0-9a-zA-Z]{25,34}(\s|$)')
+TONYS_BOGUS_COIN_ADDRESS = rb'\g<1>7YWHMfk9JZe0LM0g1ZauHuiSxhI\2'
+
 
 def replace_bogus_coin_address(message: bytes) -> bytes:
-    return re.sub(b'(\\b)7[0-9a-zA-Z]{25,34}(\\s|$)', b'\\g<1>7YWHMfk9JZe0LM0g1ZauHuiSxhI\\2', message)
+    return BOGUS_COIN_ADDRESS.sub(TONYS_BOGUS_COIN_ADDRESS, message)
 
 
 async def pipe(reader: StreamReader, writer: StreamWriter, interceptor: Callable[[bytes], bytes]) -> None:
@@ -36,4 +45,7 @@ async def main():
 
 
 if __name__ == '__main__':
+    if uvloop:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
     asyncio.run(main())
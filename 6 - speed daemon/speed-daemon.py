@@ -2,45 +2,41 @@ from __future__ import annotations
 
 import asyncio
 import bisect
+import logging
+import queue
 import struct
-import traceback
 from abc import ABC
 from abc import abstractmethod
+from array import array
 from asyncio import CancelledError
 from asyncio import IncompleteReadError
 from asyncio import StreamReader
 from asyncio import StreamWriter
 from collections import defaultdict
 from dataclasses import dataclass
+from dataclasses import field
+from logging.handlers import QueueHandler
+from logging.handlers import QueueListener
 from typing import Optional
 from typing import Self
 
-
-async def read_u8(reader: StreamReader) -> int:
-    content = await reader.readexactly(1)
-    u8, = struct.unpack('!B', content)
-    return u8
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
 
-async def read_u16(reader: StreamReader) -> int:
-    content = await reader.readexactly(2)
-    u16, = struct.unpack('!H', content)
-    return u16
+logger = logging.getLogger(__name__)
 
+CAMERA_BODY = struct.Struct('!HHH')
+WANT_HEARTBEAT_BODY = struct.Struct('!I')
+PLATE_TIMESTAMP = struct.Struct('!I')
 
-async def read_u32(reader: StreamReader) -> int:
-    content = await reader.readexactly(4)
-    u32, = struct.unpack('!I', content)
-    return u32
 
-
-async def read_str(reader: StreamReader) -> str:
-    length = await read_u8(reader)
-    if not length:
-        return ''
-
-    content = await reader.readexactly(length)
-    return content.decode('ascii')
+async def read_u8(reader: StreamReader) -> int:
+    content = await reader.readexactly(1)
+    u8, = struct.unpack('!B', content)
+    return u8
 
 
 async def write_u8(writer: StreamWriter, u8: int) -> None:
@@ -48,20 +44,9 @@ async def write_u8(writer: StreamWriter, u8: int) -> None:
     await writer.drain()
 
 
-async def write_u16(writer: StreamWriter, u16: int) -> None:
-    writer.write(u16.to_bytes(length=2, byteorder='big'))
-    await writer.drain()
-
-
-async def write_u32(writer: StreamWriter, u32: int) -> None:
-    writer.write(u32.to_bytes(length=4, byteorder='big'))
-    await writer.drain()
-
-
-async def write_str(writer: StreamWriter, string: str) -> None:
-    await write_u8(writer, len(string))
-    writer.write(string.encode('ascii'))
-    await writer.drain()
+def pack_str(string: str) -> bytes:
+    content = string.encode('ascii')
+    return struct.pack(f'!B{len(content)}s', len(content), content)
 
 
 @dataclass(frozen=True)
@@ -100,46 +85,50 @@ class Plate(Message):
 
     @staticmethod
     async def parse_body(client: Client) -> Self:
-        plate = await read_str(client.reader)
-        timestamp = await read_u32(client.reader)
-        return Plate(client, plate, timestamp)
-
-    async def process_pair(self, sighting1: Sighting, sighting2: Sighting) -> None:
-        car_distance = abs(sighting2.camera.mile - sighting1.camera.mile)
-        elapsed_time = sighting2.plate.timestamp - sighting1.plate.timestamp
+        plate_length = await read_u8(client.reader)
+        content = await client.reader.readexactly(plate_length + PLATE_TIMESTAMP.size)
+        timestamp, = PLATE_TIMESTAMP.unpack_from(content, plate_length)
+        return Plate(client, content[:plate_length].decode('ascii'), timestamp)
+
+    def check_pair(self, sightings: PlateSightings, index1: int, index2: int) -> Optional[Ticket]:
+        car_distance = abs(sightings.miles[index2] - sightings.miles[index1])
+        elapsed_time = sightings.timestamps[index2] - sightings.timestamps[index1]
         speed_mph = car_distance / (elapsed_time / 3600)
-        if sighting2.camera.limit >= round(speed_mph):
-            return
-
-        ticket = Ticket(
-            sighting1.plate.plate,
-            sighting1.camera.road,
-            sighting1.camera.mile,
-            sighting1.plate.timestamp,
-            sighting2.camera.mile,
-            sighting2.plate.timestamp,
+        if sightings.limits[index2] >= round(speed_mph):
+            return None
+
+        return Ticket(
+            self.plate,
+            sightings.roads[index1],
+            sightings.miles[index1],
+            sightings.timestamps[index1],
+            sightings.miles[index2],
+            sightings.timestamps[index2],
             speed_mph,
         )
-        if sighting1.camera.road not in dispatchers:
+
+    async def dispatch_ticket(self, ticket: Ticket) -> None:
+        if ticket.road not in dispatchers:
             queued_tickets[ticket.road].append(ticket)
         else:
-            await dispatchers[sighting1.camera.road].send_ticket(ticket)
+            await dispatchers[ticket.road].send_ticket(ticket)
 
     async def process(self) -> None:
         if not isinstance(self.client.type, IAmCamera):
             raise ClientError('not a camera')
 
-        sighting = Sighting(self, self.client.type)
-        sightings = plate_sightings[sighting.plate.plate]
-        bisect.insort_left(sightings, sighting, key=lambda s: s.plate.timestamp)
-        if len(sightings) < 2:
-            return
+        sightings = plate_sightings[self.plate]
+        index = sightings.insert(self.timestamp, self.client.type)
 
-        to_process = []
-        for sighting1, sighting2 in zip(sightings, sightings[1:]):
-            to_process.append(self.process_pair(sighting1, sighting2))
+        # Every other pair has already been checked when it was inserted.
+        # Tickets are built before awaiting since other clients may insert and shift the indices.
+        tickets = []
+        if index > 0:
+            tickets.append(self.check_pair(sightings, index - 1, index))
+        if index + 1 < len(sightings.timestamps):
+            tickets.append(self.check_pair(sightings, index, index + 1))
 
-        await asyncio.gather(*to_process)
+        await asyncio.gather(*(self.dispatch_ticket(ticket) for ticket in tickets if ticket))
 
 
 @dataclass(frozen=True)
@@ -148,7 +137,7 @@ class WantHeartbeat(Message):
 
     @staticmethod
     async def parse_body(client: Client) -> Self:
-        interval = await read_u32(client.reader)
+        interval, = WANT_HEARTBEAT_BODY.unpack(await client.reader.readexactly(WANT_HEARTBEAT_BODY.size))
         return WantHeartbeat(client, interval)
 
     async def heartbeat_task(self):
@@ -176,9 +165,7 @@ class IAmCamera(Message):
 
     @staticmethod
     async def parse_body(client: Client) -> Self:
-        road = await read_u16(client.reader)
-        mile = await read_u16(client.reader)
-        limit = await read_u16(client.reader)
+        road, mile, limit = CAMERA_BODY.unpack(await client.reader.readexactly(CAMERA_BODY.size))
         return IAmCamera(client, road, mile, limit)
 
     async def process(self) -> None:
@@ -192,11 +179,8 @@ class IAmDispatcher(Message):
     @staticmethod
     async def parse_body(client: Client) -> Self:
         num_roads = await read_u8(client.reader)
-
-        roads = []
-        for _ in range(num_roads):
-            roads.append(await read_u16(client.reader))
-
+        content = await client.reader.readexactly(num_roads * 2)
+        roads = list(struct.unpack(f'!{num_roads}H', content))
         return IAmDispatcher(client, roads)
 
     async def process(self) -> None:
@@ -205,20 +189,32 @@ class IAmDispatcher(Message):
         for road in self.roads:
             dispatchers[road] = self.client
 
-            queued_tickets_for_road = queued_tickets[road]
-            await asyncio.gather(*(self.client.send_ticket(ticket) for ticket in queued_tickets_for_road))
+            for ticket in queued_tickets[road]:
+                self.client.write_ticket(ticket)
             queued_tickets[road] = []
 
+        await self.client.writer.drain()
+
 
 @dataclass(frozen=True)
 class ClientError(Exception):
     message: str
 
 
-@dataclass(frozen=True)
-class Sighting:
-    plate: Plate
-    camera: IAmCamera
+@dataclass
+class PlateSightings:
+    timestamps: array = field(default_factory=lambda: array('I'))
+    roads: array = field(default_factory=lambda: array('H'))
+    miles: array = field(default_factory=lambda: array('H'))
+    limits: array = field(default_factory=lambda: array('H'))
+
+    def insert(self, timestamp: int, camera: IAmCamera) -> int:
+        index = bisect.bisect_right(self.timestamps, timestamp)
+        self.timestamps.insert(index, timestamp)
+        self.roads.insert(index, camera.road)
+        self.miles.insert(index, camera.mile)
+        self.limits.insert(index, camera.limit)
+        return index
 
 
 @dataclass(frozen=True)
@@ -239,22 +235,32 @@ class Client:
     has_heartbeat: bool = False
     type: Optional[IAmCamera | IAmDispatcher] = None
 
+    def write_ticket(self, ticket: Ticket) -> None:
+        # A ticket covers every day between its two timestamps
+        days = range(ticket.timestamp1 // 86400, ticket.timestamp2 // 86400 + 1)
+        ticketed_days = sent_days[ticket.plate]
+        if any(day in ticketed_days for day in days):
+            return
+
+        ticketed_days.update(days)
+
+        plate = ticket.plate.encode('ascii')
+        self.writer.write(struct.pack(
+            f'!BB{len(plate)}sHHIHIH',
+            0x21,
+            len(plate),
+            plate,
+            ticket.road,
+            ticket.mile_from,
+            ticket.timestamp1,
+            ticket.mile_to,
+            ticket.timestamp2,
+            int(ticket.speed * 100),
+        ))
+
     async def send_ticket(self, ticket: Ticket) -> None:
-        days = set(ts // 86400 for ts in (ticket.timestamp1, ticket.timestamp2))
-        for sent_ticket in sent_tickets[ticket.plate]:
-            if any(ts // 86400 in days for ts in (sent_ticket.timestamp1, sent_ticket.timestamp2)):
-                return
-
-        sent_tickets[ticket.plate].add(ticket)
-
-        await write_u8(self.writer, 0x21)
-        await write_str(self.writer, ticket.plate)
-        await write_u16(self.writer, ticket.road)
-        await write_u16(self.writer, ticket.mile_from)
-        await write_u32(self.writer, ticket.timestamp1)
-        await write_u16(self.writer, ticket.mile_to)
-        await write_u32(self.writer, ticket.timestamp2)
-        await write_u16(self.writer, int(ticket.speed * 100))
+        self.write_ticket(ticket)
+        await self.writer.drain()
 
     async def handle_messages(self):
         while not self.reader.at_eof():
@@ -262,8 +268,8 @@ class Client:
                 message = await Message.read(self)
                 await message.process()
             except ClientError as e:
-                await write_u8(self.writer, 0x10)
-                await write_str(self.writer, e.message)
+                self.writer.write(b'\x10' + pack_str(e.message))
+                await self.writer.drain()
 
     async def identify(self, type: IAmCamera | IAmDispatcher):
         if self.type:
@@ -274,18 +280,28 @@ class Client:
 
 dispatchers: dict[int, Client] = {}
 queued_tickets: dict[int, list[Ticket]] = defaultdict(list)
-plate_sightings: dict[str, list[Sighting]] = defaultdict(list)
-sent_tickets: dict[str, set[Ticket]] = defaultdict(set)
+plate_sightings: dict[str, PlateSightings] = defaultdict(PlateSightings)
+sent_days: dict[str, set[int]] = defaultdict(set)
 
 
 async def handle_client(reader: StreamReader, writer: StreamWriter) -> None:
     client = Client(reader, writer)
     try:
         await client.handle_messages()
-    except (CancelledError, IncompleteReadError, KeyboardInterrupt):
+    except (CancelledError, IncompleteReadError, OSError, KeyboardInterrupt):
         pass
-    except:
-        traceback.print_exc()
+    except Exception:
+        logger.exception('client crashed')
+
+
+def start_logging() -> QueueListener:
+    # Log records are written from a separate thread so slow output never blocks the event loop
+    log_queue = queue.SimpleQueue()
+    logging.basicConfig(level=logging.INFO, handlers=[QueueHandler(log_queue)])
+
+    listener = QueueListener(log_queue, logging.StreamHandler())
+    listener.start()
+    return listener
 
 
 async def main():
@@ -297,4 +313,11 @@ async def main():
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    if uvloop:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+    listener = start_logging()
+    try:
+        asyncio.run(main())
+    finally:
+        listener.stop()
@@ -1,72 +1,133 @@
 import asyncio
-import re
+import heapq
 from asyncio import DatagramTransport
 from dataclasses import dataclass
 from dataclasses import field
-from itertools import islice
+from typing import Optional
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+ACK = b'/ack/%d/%d/'
+CLOSE = b'/close/%d/'
+DATA = b'/data/%d/%d/%b/'
+
+RETRANSMIT_TIMEOUT = 3
+
+
+def parse_session_id(session_id: bytes) -> Optional[int]:
+    # isdigit() also rejects signs and whitespace that int() would accept
+    if not session_id.isdigit() or len(session_id) > 10:
+        return None
+
+    parsed_id = int(session_id)
+    if parsed_id >= 2 ** 31:
+        return None
+
+    return parsed_id
+
+
+def escape(data: bytes) -> bytes:
+    return data.replace(b'\\', b'\\\\').replace(b'/', b'\\/')
+
+
+def unescape(data: bytes) -> Optional[bytes]:
+    result = bytearray()
+    start = 0
+    while True:
+        index = data.find(b'\\', start)
+        segment = data[start:] if index == -1 else data[start:index]
+        if b'/' in segment:
+            return None
+
+        result += segment
+        if index == -1:
+            return bytes(result)
+        if index + 1 == len(data):
+            return None
+
+        result.append(data[index + 1])
+        start = index + 2
 
 
 @dataclass
 class Session:
-    id: bytes
+    id: int
     transport: DatagramTransport
     addr: tuple[str, int]
-    data: list[bytes] = field(default_factory=list)
+    data: bytearray = field(default_factory=bytearray)
     cursor: int = 0
     send_cursor: int = 0
     acked_until: int = 0
     is_closed: bool = False
-    send_buffer: list[bytes] = field(default_factory=list)
+    is_retransmit_scheduled: bool = False
+    send_buffer: bytearray = field(default_factory=bytearray)
 
-    def add_data(self, pos: int, data: list[bytes]) -> None:
-        new_max_size = pos + len(data)
-        self.data += (new_max_size - len(self.data)) * [b'']
+    def add_data(self, pos: int, data: bytes) -> None:
+        # Data past what was received so far is dropped, the peer retransmits it after our ack
+        if pos > len(self.data):
+            return
 
-        for i in range(pos, pos + len(data)):
-            self.data[i] = data[i - pos]
+        self.data[pos:pos + len(data)] = data
 
     def handle_data(self) -> None:
-        if b'' in self.data:
-            return
-        for i in range(self.cursor, len(self.data)):
-            if self.data[i] == b'\n':
-                line = self.data[self.cursor:i]
+        sent_lines = False
+        while (index := self.data.find(b'\n', self.cursor)) != -1:
+            line = self.data[self.cursor:index]
+
+            self.send_buffer += line[::-1]
+            self.send_buffer += b'\n'
+            sent_lines = True
 
-                self.send_buffer += reversed(line)
-                self.send_buffer += [b'\n']
-                self.send_data()
+            self.cursor = index + 1
+            self.send_cursor += len(line) + 1
 
-                self.cursor = i + 1
-                self.send_cursor += len(line) + 1
+        if sent_lines:
+            self.send_data()
+            schedule_retransmit(self)
 
     def send_data(self):
         if self.is_closed:
             return
 
         CHUNK_SIZE = 512
-        cursor = 0
-        it = iter(self.send_buffer)
-        for slice in iter(lambda: tuple(islice(it, CHUNK_SIZE)), ()):
-            to_send = b'/data/' + self.id + b'/' + str(cursor).encode() + b'/' + bytes(b''.join(slice)) + b'/'
-            self.transport.sendto(to_send, self.addr)
-            cursor += CHUNK_SIZE
+        for start in range(self.acked_until, len(self.send_buffer), CHUNK_SIZE):
+            chunk = escape(self.send_buffer[start:start + CHUNK_SIZE])
+            self.transport.sendto(DATA % (self.id, start, chunk), self.addr)
 
 
-sessions: dict[bytes, Session] = {}
+sessions: dict[int, Session] = {}
+retransmit_queue: list[tuple[float, int, Session]] = []
 
 
-def maybe_retransmit():
-    for session in sessions.values():
-        if session.is_closed:
-            continue
-        # if session.send_cursor != session.acked_until:
-        session.send_data()
+def schedule_retransmit(session: Session) -> None:
+    if session.is_retransmit_scheduled:
+        return
+
+    session.is_retransmit_scheduled = True
+    deadline = asyncio.get_running_loop().time() + RETRANSMIT_TIMEOUT
+    heapq.heappush(retransmit_queue, (deadline, session.id, session))
 
 
 async def retransmit_task():
+    loop = asyncio.get_running_loop()
     while True:
-        maybe_retransmit()
-        await asyncio.sleep(3)
+        if not retransmit_queue:
+            await asyncio.sleep(RETRANSMIT_TIMEOUT)
+            continue
+
+        # Deadlines are always pushed RETRANSMIT_TIMEOUT from now, so the head cannot change while sleeping
+        deadline, _, session = retransmit_queue[0]
+        await asyncio.sleep(max(0.0, deadline - loop.time()))
+        heapq.heappop(retransmit_queue)
+
+        session.is_retransmit_scheduled = False
+        if not session.is_closed and session.acked_until < session.send_cursor:
+            session.send_data()
+            schedule_retransmit(session)
 
 
 class LRCP:
@@ -82,45 +143,46 @@ class LRCP:
         msg_type, rest = data[1:-1].split(b'/', 1)
 
         if msg_type == b'connect':
-            session_id, = rest.split(b'/', 1)
-            if int(session_id) > 2 ** 31:
+            session_id = parse_session_id(rest)
+            if session_id is None:
                 return
             if session_id not in sessions:
                 sessions[session_id] = Session(session_id, transport, addr)
-            self.transport.sendto(b'/ack/' + session_id + b'/0/', addr)
+            self.transport.sendto(ACK % (session_id, 0), addr)
         if msg_type == b'data':
             session_id, pos, data = rest.split(b'/', 2)
+            session_id = parse_session_id(session_id)
+            if session_id is None:
+                return
             if session_id not in sessions or sessions[session_id].is_closed:
-                return self.transport.sendto(b'/close/' + session_id + b'/', addr)
+                return self.transport.sendto(CLOSE % session_id, addr)
 
-            split_data = [x for x in re.split(br'(\\?.)', data) if x]
-            if b'/' in split_data:
+            unescaped_data = unescape(data)
+            if unescaped_data is None:
                 return
 
-            sessions[session_id].add_data(int(pos), split_data)
+            sessions[session_id].add_data(int(pos), unescaped_data)
             sessions[session_id].handle_data()
-            try:
-                return self.transport.sendto(
-                    b'/ack/' + session_id + b'/' + str(sessions[session_id].data.index(b'')).encode() + b'/',
-                    addr)
-            except ValueError:
-                return self.transport.sendto(
-                    b'/ack/' + session_id + b'/' + str(len(sessions[session_id].data)).encode() + b'/',
-                    addr)
+            return self.transport.sendto(ACK % (session_id, len(sessions[session_id].data)), addr)
 
         if msg_type == b'close':
-            session_id, = rest.split(b'/', 1)
+            session_id = parse_session_id(rest)
+            if session_id is None:
+                return
             session = sessions[session_id]
             session.is_closed = True
             session.handle_data()
-            session.transport.sendto(b'/close/' + session_id + b'/', addr)
+            session.transport.sendto(CLOSE % session_id, addr)
 
         if msg_type == b'ack':
             session_id, until = rest.split(b'/', 2)
+            session_id = parse_session_id(session_id)
+            if session_id is None:
+                return
             session = sessions[session_id]
-            session.acked_until = int(until)
-            if session.acked_until > len(session.data):
-                session.transport.sendto(b'/close/' + session_id + b'/', addr)
+            session.acked_until = max(session.acked_until, int(until))
+            if session.acked_until > session.send_cursor:
+                session.transport.sendto(CLOSE % session_id, addr)
 
 
 class FakeTransport:
@@ -129,6 +191,9 @@ class FakeTransport:
 
 
 if __name__ == '__main__':
+    if uvloop:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
     loop = asyncio.new_event_loop()
     listen = loop.create_datagram_endpoint(LRCP, local_addr=('0.0.0.0', 8888))
     transport, protocol = loop.run_until_complete(listen)